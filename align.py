@@ -1,16 +1,17 @@
 #
 
-import os
 from abc import ABC
-from collections import Counter
 
-import gensim
 import numpy as np
 import pandas as pd
 import scipy
-from nltk.tokenize import sent_tokenize
 from sklearn.cross_decomposition import CCA
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from cluster import N_CLUSTERS, ContentClusters
+from corpus import FileIndex, tokenize_text
+from telemetry import metrics
 
 
 class Aligner(ABC):
@@ -30,6 +31,28 @@ class Aligner(ABC):
         """
         pass
 
+    def project(self, mtx):
+        """
+        MTX -> MTX
+        Source vectors in the space of target_mtx.
+        """
+        return self.translate_mtx(mtx)
+
+    def target_mtx(self):
+        """
+        -> MTX
+        Target vocabulary in the space of project, aligned to id2wB.
+        """
+        return self.mtxB
+
+    def to_target(self, mtx):
+        """
+        MTX -> MTX
+        Source vectors in the original space of the target model, so that the vectors
+        of two aligners onto the same target model are comparable.
+        """
+        return self.translate_mtx(mtx)
+
     def encode_input(self, words):
         """
         [STRING] -> MTX
@@ -41,10 +64,11 @@ class Aligner(ABC):
         """
         MTX -> [[STRING]]
         """
-        similarities = cosine_similarity(mtx, self.mtxB)
-        most_similar = np.argsort(similarities, axis=1)[:, ::-1]
-        topsims = np.sort(similarities, axis=1)[:, ::-1][:, :k]
-        res = [[self.id2wB[i] for i in row[:k]] for row in most_similar]
+        with metrics.stage('align.decode_output', method=self.method):
+            similarities = cosine_similarity(mtx, self.mtxB)
+            most_similar = np.argsort(similarities, axis=1)[:, ::-1]
+            topsims = np.sort(similarities, axis=1)[:, ::-1][:, :k]
+            res = [[self.id2wB[i] for i in row[:k]] for row in most_similar]
         return res, topsims
 
     def translate_word(self, word, k=1):
@@ -73,6 +97,18 @@ class CCAAligner(Aligner):
     def translate_mtx(self, mtx):
         return mtx
 
+    def project(self, mtx):
+        return self.cca.transform(mtx)
+
+    def target_mtx(self):
+        return self.cca.transform(np.zeros([self.mtxB.shape[0], self.mtxA.shape[1]]), self.mtxB)[1]
+
+    def to_target(self, mtx):
+        # the canonical space is specific to each aligner, map the canonical vectors back
+        # through the target side, exact as the cca keeps all the dimensions
+        proj = self.project(mtx)
+        return self.cca.inverse_transform(np.zeros_like(proj), proj)[1]
+
     def translate_word(self, word, k=1):
         tmpA = self.mtxA
         tmpB = self.mtxB
@@ -114,6 +150,7 @@ def align_svd(source, target):
     return T
 
 
+@metrics.timed('align.fit_cca')
 def get_cca_aligner(model_a, model_b, anchorlist):
     # get wordmaps
     awords = list(sorted(list(model_a.wv.key_to_index)))
@@ -140,6 +177,7 @@ def get_cca_aligner(model_a, model_b, anchorlist):
     return aligner
 
 
+@metrics.timed('align.fit_svd')
 def get_svd_aligner(model_a, model_b, anchorlist):
     # get wordmaps
     awords = list(sorted(list(model_a.wv.vocab)))
@@ -171,66 +209,67 @@ def JS_divergence(p, q):
     return 0.5 * scipy.stats.entropy(p, M, base=2) + 0.5 * scipy.stats.entropy(q, M, base=2)
 
 
-def research_topic(keywords, t_align, forward_cnn, forward_nypost, model_general, model_cnn, model_nypost):
-
-    # Gether the articles from topic-specified files.
-    cnn_path = f"CNN_{keywords}"
-    for f_name in os.listdir("./data/CNN"):
-        if f_name.startswith(cnn_path):
-            break
-    cnn_file = open(os.path.join("./data/CNN", f_name), 'r')
-
-    nypost_path = f"nypost_{keywords}"
-    for f_name in os.listdir("./data/nypost"):
-        if f_name.startswith(nypost_path):
-            break
-    nypost_file = open(os.path.join("./data/nypost", f_name), 'r')
+def topic_coverage(df, clusters):
+    """
+    Count the words of the articles in each content cluster, and get the vocabulary ids
+    of the clustered words, once per sentence they occur in.
+    """
+    sentences = [st for text in df['text'] for st in tokenize_text(text)]
+    tokens = [w for st in sentences for w in st]
+    sents = np.repeat(np.arange(len(sentences)), [len(st) for st in sentences])
+    ids = clusters.lookup(tokens)
+    labels = clusters.labels_of(ids)
+    hit = labels >= 0
+    t_vec = np.bincount(labels[hit], minlength=clusters.n_clusters).astype(float)
+    pairs = np.unique(np.stack([sents[hit], ids[hit]]), axis=1)
+    return t_vec, pairs[1]
+
+
+@metrics.timed('research_topic')
+def research_topic(keywords, t_align, forward_cnn, forward_nypost, model_general, model_cnn, model_nypost,
+                   root='./data', index=None, shift=None):
+
+    # Gether the articles from topic-specified files, index is a prebuilt corpus.FileIndex of root.
+    if index is None:
+        index = FileIndex(root, ['CNN', 'nypost'])
+    cnn_file = index.find('CNN', keywords)
+    nypost_file = index.find('nypost', keywords)
 
     # Count the content cluster attrbution of each word, and generate the articles' coverage
     # representation vector, by proportion of each content cluster with the articles.
-    word_intersec = []
-    t_vec_cnn = np.zeros(300)
-    df = pd.read_csv(cnn_file)
-    all_cnn = 0
-    for idx, row in df.iterrows():
-        for st in sent_tokenize(str(row['text'])):
-            sts_list = gensim.utils.simple_preprocess(st)
-            hist = Counter(sts_list)
-            for k in hist:
-                num = t_align.get(k, -1)
-                if num >= 0:
-                    word_intersec.append(k)
-                    all_cnn += hist[k]
-                    t_vec_cnn[num] += hist[k]
-    t_vec_cnn /= all_cnn
-
-    t_vec_nypost = np.zeros(300)
-    df = pd.read_csv(nypost_file)
-    all_nypost = 0
-    for idx, row in df.iterrows():
-        for st in sent_tokenize(str(row['text'])):
-            sts_list = gensim.utils.simple_preprocess(st)
-            hist = Counter(sts_list)
-            for k in hist:
-                num = t_align.get(k, -1)
-                if num >= 0:
-                    word_intersec.append(k)
-                    all_nypost += hist[k]
-                    t_vec_nypost[num] += hist[k]
-    t_vec_nypost /= all_nypost
+    if isinstance(t_align, dict):
+        t_align = ContentClusters.from_dict(t_align, N_CLUSTERS)
+    with metrics.stage('research_topic.coverage', topic=keywords):
+        t_vec_cnn, intersec_cnn = topic_coverage(pd.read_csv(cnn_file), t_align)
+        t_vec_nypost, intersec_nypost = topic_coverage(pd.read_csv(nypost_file), t_align)
+    word_intersec = np.concatenate([intersec_cnn, intersec_nypost])
+    t_vec_cnn /= t_vec_cnn.sum()
+    t_vec_nypost /= t_vec_nypost.sum()
     # Calculate their variance by two measures. It turns out that the JS works better than cosine
     # similarity, for it can distinguish words better.
     topic_js = JS_divergence(t_vec_nypost, t_vec_cnn)
     topic_cos = cosine_similarity(np.array(t_vec_nypost).reshape([1, -1]), np.array(t_vec_cnn).reshape([1, -1]))
 
-    # Calculate the average cosine similarity of shared words by cnn embedding and nypost embedding.
-    dis = []
-    for wd in word_intersec:
-        if wd in model_general.wv.key_to_index and wd in model_cnn.wv.key_to_index:
-            vec_nypost = forward_nypost.translate_mtx(model_nypost.wv[wd])
-            vec_cnn = forward_cnn.translate_mtx(model_cnn.wv[wd])
-            cos_sim = cosine_similarity(np.array(vec_nypost).reshape([1, -1]), np.array(vec_cnn).reshape([1, -1]))
-            dis.append(cos_sim)
-    mean_c = np.mean(np.array(dis))
+    # Calculate the average cosine similarity of shared words by cnn embedding and nypost embedding,
+    # each distinct word once, weighted by the number of sentences it occurs in.
+    # With a precomputed shift.SemanticShift table of the models, this is a weighted lookup with the same value.
+    with metrics.stage('research_topic.similarity', topic=keywords):
+        counts = np.bincount(word_intersec, minlength=len(t_align.vocab))
+        if shift is not None:
+            ids = np.flatnonzero(counts)
+            mean_c = shift.score([t_align.vocab[idx] for idx in ids], weights=counts[ids])
+        else:
+            ids = [idx for idx in np.flatnonzero(counts)
+                   if all(t_align.vocab[idx] in model.wv.key_to_index
+                          for model in [model_general, model_cnn, model_nypost])]
+            words = [t_align.vocab[idx] for idx in ids]
+            if not words:
+                # no shared words, the mean is undefined as in the mean of an empty list
+                mean_c = np.nan
+            else:
+                vec_nypost = forward_nypost.translate_mtx(model_nypost.wv[words])
+                vec_cnn = forward_cnn.translate_mtx(model_cnn.wv[words])
+                dis = np.sum(normalize(vec_nypost) * normalize(vec_cnn), axis=1)
+                mean_c = np.average(dis, weights=counts[ids])
 
     return topic_js, topic_cos, mean_c, t_vec_cnn, t_vec_nypost
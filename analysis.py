@@ -1,32 +1,40 @@
 
 
 import string
+import functools
 import pandas as pd
-import matplotlib.pyplot as plt
-
-
 
 import nltk
 from nltk.corpus import stopwords
-from gensim import corpora, models
-from gensim.utils import effective_n_jobs
-import pyLDAvis
-import pyLDAvis.gensim_models
-from wordcloud import WordCloud
 
 import os
 import gc
 
+# gensim, matplotlib and wordcloud are imported by the functions using them, so that
+# importing this module stays cheap for the jobs that do not need them
+
 # functions to lemmatize news texts
-STOP = set(nltk.corpus.stopwords.words('english') + list(string.punctuation) + ['``', "''", "’", "“", "”","–", "\'s"])
+@functools.lru_cache(maxsize=None)
+def get_stop():
+    '''
+    the stop words, punctuation and study-specific stop words, loaded on first use
+    '''
+    return set(nltk.corpus.stopwords.words('english') + list(string.punctuation) + ['``', "''", "’", "“", "”","–", "\'s"])
+
+def __getattr__(name):
+    # STOP is loaded on first access
+    if name == 'STOP':
+        return get_stop()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def get_lemmas(text):
     '''
     Gets lemmas for a string input, excluding stop words, punctuation, as well
     as a set of study-specific stop-words
     '''
+    stop = get_stop()
     lemmas = [nltk.stem.WordNetLemmatizer().lemmatize(t)
-              for t in nltk.word_tokenize((str(text).lower())) if t not in STOP
+              for t in nltk.word_tokenize((str(text).lower())) if t not in stop
               ]
     return lemmas
 
@@ -37,6 +45,9 @@ def compute_coherence_values(dictionary, corpus, texts, limit, start=2, step=2):
     Returns list of models along with their respective coherence values (pick
     models with the highest coherence)
     '''
+    from gensim import models
+    from gensim.utils import effective_n_jobs
+
     coherence_values = []
     model_list = []
     for num_topics in range(start, limit, step):
@@ -62,6 +73,8 @@ def train_lda(topic_df, model_name, num_topics, workers):
         num_topics: number of topics to be trained
         workers: number of workers to be used in training
     '''
+    from gensim import corpora, models
+
     # Get lemmas for each article
     lemmas = topic_df['text'].apply(get_lemmas)
     #reduce memory load
@@ -102,6 +115,8 @@ class Word_Cloud(object):
                  root='data',
                  limit=5000,
                  custom_stopwords=[None]):
+        from wordcloud import WordCloud
+
         self.medias = medias
         self.keywords = keywords
         self.stopwords = stopwords.words('english')
@@ -129,6 +144,8 @@ class Word_Cloud(object):
         '''
         show and save the word cloud of the news titles and texts
         '''
+        import matplotlib.pyplot as plt
+
         print('This may take a while has high demand on RAM', flush=True)
         for id, title in enumerate(self.titles):
             # load data
@@ -0,0 +1,327 @@
+'''
+Offline benchmarks of the crawl, align and analysis hot paths.
+
+Each stage runs in a fresh process and reports its time, peak RSS and throughput.
+The crawler is served by a local stub server of pages recorded from the news under
+data/, the aligners use synthetic embeddings, and the analysis stages read data/.
+The results are compared against benchmarks/baseline.json if it exists, the run
+exits with 1 on a regression or if any stage failed.
+
+Run from the root of the repository:
+    python -m benchmarks.run                    # run all the stages and compare
+    python -m benchmarks.run --save-baseline    # save the results as the new baseline
+    python -m benchmarks.run --stages decode_output research_topic --repeat 5
+'''
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import types
+from queue import Empty
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'data')
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+def bench_get_urls(opts):
+    '''
+    SearchEngine.get_urls on the stub search pages, throughput in pages
+    '''
+    import requests
+    import crawl
+
+    # send the nypost search requests to the stub server
+    def get(url, **kwargs):
+        return requests.get(opts['url'] + urlparse(url).path, **kwargs)
+    crawl.requests = types.SimpleNamespace(get=get)
+
+    engine = crawl.SearchEngine(name='nypost', keyword=opts['keyword'], process=False)
+
+    def run():
+        for page in range(1, opts['pages'] + 1):
+            engine.urls.extend(engine.get_urls(page))
+        return opts['pages']
+    return run, 'pages'
+
+
+def bench_parse(opts):
+    '''
+    SearchEngine.parse and save of the stub articles, throughput in articles
+    '''
+    import crawl
+
+    tmp = tempfile.mkdtemp(dir=opts['tmp'])
+    os.makedirs(os.path.join(tmp, 'nypost'))
+    engine = crawl.SearchEngine(name='nypost', keyword=opts['keyword'], process=False, root=tmp, sleep3=0)
+    engine.urls = [f'{opts["url"]}/article/{opts["media"]}/{opts["keyword"]}/{i}' for i in range(opts['articles'])]
+    engine.num = len(engine.urls)
+
+    def run():
+        engine.parse()
+        engine.save()
+        return opts['articles']
+    return run, 'articles'
+
+
+def bench_decode_output(opts):
+    '''
+    Aligner.decode_output of batches of synthetic vectors, throughput in words
+    '''
+    import numpy as np
+    from align import SVDAligner
+
+    rng = np.random.default_rng(0)
+    vocab = opts['vocab']
+    dims = opts['dims']
+    aligner = SVDAligner('svd', None, None, {}, {i: f'w{i}' for i in range(vocab)},
+                         None, rng.normal(size=(vocab, dims)), [])
+    aligner.set_params(np.eye(dims))
+    batches = [rng.normal(size=(opts['batch'], dims)) for _ in range(opts['batches'])]
+
+    def run():
+        for mtx in batches:
+            aligner.decode_output(aligner.translate_mtx(mtx), k=10)
+        return opts['batch'] * opts['batches']
+    return run, 'words'
+
+
+def bench_research_topic(opts):
+    '''
+    research_topic on two medias of data/ standing for CNN and nypost,
+    with synthetic embeddings, throughput in articles
+    '''
+    import numpy as np
+    import pandas as pd
+    from gensim.models import KeyedVectors
+
+    from align import SVDAligner, research_topic
+    from cluster import ContentClusters
+    from corpus import FileIndex, tokenize_text
+
+    tmp = tempfile.mkdtemp(dir=opts['tmp'])
+    dfs = {}
+    for media, source in [('CNN', opts['left']), ('nypost', opts['media'])]:
+        os.makedirs(os.path.join(tmp, media))
+        dfs[media] = pd.read_csv(os.path.join(DATA, source, f'{source}_{opts["keyword"]}.csv'))
+        dfs[media].to_csv(os.path.join(tmp, media, f'{media}_{opts["keyword"]}.csv'), index=False)
+    vocab = sorted({w for df in dfs.values() for text in df['text'] for st in tokenize_text(text) for w in st})
+
+    rng = np.random.default_rng(0)
+    models = []
+    for _ in range(3):
+        kv = KeyedVectors(opts['dims'])
+        kv.add_vectors(vocab, rng.normal(size=(len(vocab), opts['dims'])).astype(np.float32))
+        models.append(types.SimpleNamespace(wv=kv))
+    clusters = ContentClusters(vocab, rng.integers(-1, 300, len(vocab)), 300)
+    aligners = []
+    for _ in range(2):
+        aligner = SVDAligner('svd', None, None, {}, {}, None, None, [])
+        aligner.set_params(np.linalg.qr(rng.normal(size=(opts['dims'], opts['dims'])))[0])
+        aligners.append(aligner)
+    index = FileIndex(tmp, ['CNN', 'nypost'])
+
+    def run():
+        research_topic(opts['keyword'], clusters, *aligners, *models, index=index)
+        return sum(len(df) for df in dfs.values())
+    return run, 'articles'
+
+
+def bench_get_lemmas(opts):
+    '''
+    analysis.get_lemmas of the news texts, throughput in docs
+    '''
+    import pandas as pd
+    from analysis import get_lemmas
+
+    texts = pd.read_csv(os.path.join(DATA, opts['media'], f'{opts["media"]}_{opts["keyword"]}.csv'))['text']
+    texts = texts[:opts['docs']]
+
+    def run():
+        for text in texts:
+            get_lemmas(text)
+        return len(texts)
+    return run, 'docs'
+
+
+def bench_word_cloud(opts):
+    '''
+    Word_Cloud.show of the news of a media and keyword, throughput in articles
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas as pd
+    from analysis import Word_Cloud
+
+    tmp = tempfile.mkdtemp(dir=opts['tmp'])
+    os.makedirs(os.path.join(tmp, 'figures'))
+    os.chdir(tmp)
+    wc = Word_Cloud(medias=[opts['media']], keywords=[opts['keyword']], root=DATA, limit=opts['docs'],
+                    custom_stopwords=[])
+    n = min(len(wc.load_data(0)), opts['docs'])
+
+    def run():
+        wc.show()
+        return n
+    return run, 'articles'
+
+
+STAGES = {'get_urls': bench_get_urls,
+          'parse': bench_parse,
+          'decode_output': bench_decode_output,
+          'research_topic': bench_research_topic,
+          'get_lemmas': bench_get_lemmas,
+          'word_cloud': bench_word_cloud}
+
+
+def run_stage(name, opts, queue):
+    '''
+    Set up and run a stage in this process, and put its measures in the queue
+    '''
+    try:
+        sys.path.insert(0, ROOT)
+        os.chdir(ROOT)
+        run, unit = STAGES[name](opts)
+        gc.collect()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        items = run()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        queue.put({'time': elapsed,
+                   'peak_rss_mb': peak / scale,
+                   'rss_growth_mb': (peak - rss_before) / scale,
+                   'items': items,
+                   'unit': unit,
+                   'throughput': items / elapsed})
+    except Exception as e:
+        message = next((line.strip() for line in str(e).splitlines() if any(c.isalpha() for c in line)), '')
+        queue.put({'error': f'{type(e).__name__}: {message}'})
+
+
+def wait(proc, queue, timeout):
+    '''
+    Wait for the measures of a stage process, or fail if it dies without reporting
+    them (e.g. killed when out of memory) or runs longer than timeout seconds
+    '''
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            pass
+        if not proc.is_alive():
+            # the measures may have been sent just before the process exited
+            try:
+                return queue.get(timeout=1)
+            except Empty:
+                return {'error': f'the stage process exited with code {proc.exitcode} without reporting'}
+        if time.monotonic() > deadline:
+            proc.kill()
+            return {'error': f'timed out after {timeout}s'}
+
+
+def measure(name, opts, repeat, timeout=3600):
+    '''
+    Run a stage repeat times, each time in a fresh process, and keep the best time and the highest peak RSS
+    '''
+    ctx = mp.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_stage, args=(name, opts, queue))
+        proc.start()
+        res = wait(proc, queue, timeout)
+        proc.join()
+        if 'error' in res:
+            return res
+        runs.append(res)
+    best = min(runs, key=lambda res: res['time'])
+    return dict(best, peak_rss_mb=max(res['peak_rss_mb'] for res in runs))
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Find the stages slower or larger than the baseline by more than tolerance,
+    and the stages that failed
+    '''
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if 'error' in res:
+            passed = ', passed in the baseline' if base and 'error' not in base else ''
+            regressions.append(f'{name} failed{passed}: {res["error"]}')
+            continue
+        if not base or 'error' in base:
+            continue
+        for key in ['time', 'peak_rss_mb']:
+            if res[key] > base[key] * (1 + tolerance):
+                regressions.append(f'{name} {key}: {res[key]:.3f} vs baseline {base[key]:.3f}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the crawl, align and analysis hot paths')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each stage, the best time is kept')
+    parser.add_argument('--media', default='federalist', help='media of data/ served to the crawler')
+    parser.add_argument('--left', default='foxnews', help='media of data/ standing for CNN in research_topic')
+    parser.add_argument('--keyword', default='gun')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--articles', type=int, default=50)
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--vocab', type=int, default=10000)
+    parser.add_argument('--dims', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--batches', type=int, default=10)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown over the baseline')
+    parser.add_argument('--output', help='json file to write the results to')
+    parser.add_argument('--timeout', type=float, default=3600, help='longest time in seconds of a stage run')
+    args = parser.parse_args(argv)
+
+    from benchmarks.stub_server import StubServer
+
+    results = {}
+    work = tempfile.mkdtemp()
+    with StubServer(args.media, DATA) as server:
+        opts = dict(vars(args), url=server.url, tmp=work)
+        for name in args.stages:
+            res = results[name] = measure(name, opts, args.repeat, args.timeout)
+            if 'error' in res:
+                print(f'{name:<16} failed: {res["error"]}', flush=True)
+            else:
+                print(f'{name:<16} {res["time"]:9.3f}s {res["peak_rss_mb"]:9.1f}MB '
+                      f'{res["throughput"]:10.1f} {res["unit"]}/s', flush=True)
+    shutil.rmtree(work)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved baseline to {args.baseline}', flush=True)
+        return 1 if any('error' in res for res in results.values()) else 0
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f'Regression: {r}', flush=True)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
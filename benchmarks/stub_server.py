@@ -0,0 +1,127 @@
+import html
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pandas as pd
+
+# number of article links on a search page, as on nypost
+PAGE_SIZE = 10
+
+SEARCH_PAGE = '''<html><head><title>Search results for {keyword}</title></head><body>
+<div class="search-results">
+{links}
+</div></body></html>'''
+
+SEARCH_LINK = '''<div class="story"><a class="postid-{i} story__headline" href="{base}/article/{media}/{keyword}/{i}">{title}</a></div>'''
+
+ARTICLE_PAGE = '''<html><head><title>{title}</title>
+<meta property="og:title" content="{title}">
+<meta property="article:published_time" content="{date}">
+</head><body><article><h1>{title}</h1>
+<div class="entry-content">
+{paragraphs}
+</div></article></body></html>'''
+
+
+class Pages(object):
+    '''
+    Search pages and article pages recorded from the news collected under data/,
+    rendered the way the nypost search pages and articles are laid out.
+
+    Parameters
+    ----------
+    root: str, root directory of the collected news
+    frames: dict, the news of each (media, keyword), loaded on first use
+    '''
+    def __init__(self, root='data'):
+        self.root = root
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def news(self, media, keyword):
+        with self.lock:
+            if (media, keyword) not in self.frames:
+                path = os.path.join(self.root, media, f'{media}_{keyword}.csv')
+                df = pd.read_csv(path).dropna(subset=['title', 'text'])
+                self.frames[(media, keyword)] = df.reset_index(drop=True)
+            return self.frames[(media, keyword)]
+
+    def search(self, base, media, keyword, page):
+        df = self.news(media, keyword)
+        start = (page - 1) * PAGE_SIZE
+        links = [SEARCH_LINK.format(i=i, base=base, media=media, keyword=keyword,
+                                    title=html.escape(str(df['title'][i])))
+                 for i in range(start, min(start + PAGE_SIZE, len(df)))]
+        return SEARCH_PAGE.format(keyword=html.escape(keyword), links='\n'.join(links))
+
+    def article(self, media, keyword, i):
+        row = self.news(media, keyword).iloc[i]
+        paragraphs = '\n'.join(f'<p>{html.escape(p)}</p>' for p in str(row['text']).split('\n') if p.strip())
+        return ARTICLE_PAGE.format(title=html.escape(str(row['title'])),
+                                   date=html.escape(str(row['published_time'])),
+                                   paragraphs=paragraphs)
+
+
+class StubServer(object):
+    '''
+    A local HTTP server of the recorded pages, so that the crawler can be benchmarked offline.
+    The search pages are served under /search/{keyword}/page/{page}/ for the news of
+    the media given, and the articles under /article/{media}/{keyword}/{i}.
+
+    Parameters
+    ----------
+    media: str, media of the news the search pages link to
+    root: str, root directory of the collected news
+    url: str, base url of the server once started
+    '''
+    def __init__(self, media='federalist', root='data'):
+        self.media = media
+        self.pages = Pages(root)
+        self.server = None
+        self.url = None
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = [p for p in urlparse(self.path).path.split('/') if p]
+                try:
+                    if len(parts) == 4 and parts[0] == 'search' and parts[2] == 'page':
+                        body = stub.pages.search(stub.url, stub.media, parts[1], int(parts[3]))
+                    elif len(parts) == 4 and parts[0] == 'article':
+                        body = stub.pages.article(parts[1], parts[2], int(parts[3]))
+                    else:
+                        raise KeyError(self.path)
+                except (KeyError, IndexError, ValueError, FileNotFoundError):
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,183 @@
+'''
+Command line entry point of the pipeline, for scheduled jobs:
+
+    python cli.py crawl --medias CNN nypost --keywords-file keywords.txt --endpage 20
+    python cli.py train --medias CNN nypost --out models
+    python cli.py align --models models --clusters 300
+    python cli.py analyze --topics gun police war --models models --out topics.csv
+
+Only the argument parsing is done at import, each subcommand imports the modules
+it needs when it runs, so a crawl job does not load gensim, sklearn or matplotlib
+and an analyze job does not load the crawler.
+'''
+import argparse
+import os
+import sys
+
+
+def read_list(values, path):
+    '''
+    the values given on the command line, or one per line of a file
+    '''
+    if path:
+        with open(path, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    return values or []
+
+
+def crawl(args):
+    '''
+    get the news of the keywords from the medias
+    '''
+    from crawl import SearchEngine
+
+    keywords = read_list(args.keywords, args.keywords_file)
+    if not keywords:
+        raise SystemExit('crawl: no keywords given')
+    engine = SearchEngine(startpage=args.startpage, endpage=args.endpage, process=False, root=args.root)
+    engine.auto(args.medias, keywords)
+
+
+def train(args):
+    '''
+    train the Word2Vec model of each media and the general model of all the medias,
+    and save their word frequency tables, counted while the news are tokenized
+    '''
+    from corpus import Corpora, Corpus, W2V_OPTS, train_word2vec
+
+    os.makedirs(args.out, exist_ok=True)
+    # the options not given keep their defaults of W2V_OPTS
+    opts = {k: getattr(args, k) for k in W2V_OPTS if getattr(args, k) is not None}
+    corpora = {media: Corpus(media, root=args.root, workers=args.workers) for media in args.medias}
+    corpus_general = Corpora(corpora.values(), args.workers).build()
+
+    for media, corpus in corpora.items():
+        print(f'Training {media}...', flush=True)
+        corpus.frequencies().save(os.path.join(args.out, f'{media.lower()}_word_freq_add.npz'))
+        train_word2vec(corpus, os.path.join(args.out, f'{media.lower()}_add.model'), **opts)
+    print('Training general...', flush=True)
+    corpus_general.frequencies().save(os.path.join(args.out, 'general_word_freq_add.npz'))
+    train_word2vec(corpus_general, os.path.join(args.out, 'general_add.model'), **opts)
+
+
+def align(args):
+    '''
+    Align the CNN and nypost models to the general model on the shared stopwords,
+    cluster the general vocabulary into content clusters and score the semantic
+    shift between the two aligned models
+    '''
+    import pickle
+
+    import gensim
+    from gensim.parsing.preprocessing import STOPWORDS
+    from nltk.corpus import stopwords
+
+    from align import get_cca_aligner
+    from cluster import ContentClusters
+    from shift import SemanticShift
+
+    def load(name):
+        return gensim.models.Word2Vec.load(os.path.join(args.models, f'{name}_add.model'))
+
+    model_general, model_cnn, model_nypost = load('general'), load('cnn'), load('nypost')
+    stopwords_all = set(stopwords.words('english')) | STOPWORDS
+
+    print('Clustering...', flush=True)
+    t_align = ContentClusters.fit(model_general, stopwords=stopwords_all, n_clusters=args.clusters)
+    t_align.save(os.path.join(args.models, 't_align.npz'))
+
+    # the anchors are the stopwords shared by the three models
+    shared_vocab = set(model_nypost.wv.key_to_index) & set(model_cnn.wv.key_to_index) & set(model_general.wv.key_to_index)
+    anchors = sorted(stopwords_all & shared_vocab)
+    aligners = {}
+    for name, model in [('cnn', model_cnn), ('nypost', model_nypost)]:
+        print(f'Aligning {name}...', flush=True)
+        aligners[name] = get_cca_aligner(model, model_general, anchors)
+        with open(os.path.join(args.models, f'align_{name}_add.pkl'), 'wb') as f:
+            pickle.dump(aligners[name], f)
+
+    print('Scoring the semantic shift...', flush=True)
+    shift = SemanticShift.compute(aligners['cnn'], aligners['nypost'], model_cnn, model_nypost, model_general)
+    shift.save(os.path.join(args.models, 'shift_add.npz'))
+
+
+def analyze(args):
+    '''
+    compare the topics between CNN and nypost and write the results to a csv file
+    '''
+    from runner import TopicRunner
+
+    topics = read_list(args.topics, args.topics_file)
+    if not topics:
+        raise SystemExit('analyze: no topics given')
+    paths = {'t_align': os.path.join(args.models, 't_align.npz'),
+             'forward_cnn': os.path.join(args.models, 'align_cnn_add.pkl'),
+             'forward_nypost': os.path.join(args.models, 'align_nypost_add.pkl'),
+             'model_general': os.path.join(args.models, 'general_add.model'),
+             'model_cnn': os.path.join(args.models, 'cnn_add.model'),
+             'model_nypost': os.path.join(args.models, 'nypost_add.model')}
+    if args.shift:
+        paths['shift'] = os.path.join(args.models, 'shift_add.npz')
+    runner = TopicRunner(paths, root=args.root, cache=args.cache, workers=args.workers)
+    runner.table(topics).to_csv(args.out, index_label='topic')
+    print(f'Saved {len(topics)} topics to {args.out}', flush=True)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Crawl the news, train and align the embedding models, and analyze topics')
+    parser.add_argument('--metrics', help='json-lines file to append the performance metrics to')
+    parser.add_argument('--profile', help='comma separated stages to profile with cProfile, or all')
+    parser.add_argument('--profile-dir', default='profiles', help='directory to save the profiles to')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('crawl', help='get the news of keywords from medias')
+    p.add_argument('--medias', nargs='+', default=['CNN', 'nypost'])
+    p.add_argument('--keywords', nargs='+')
+    p.add_argument('--keywords-file', help='file of keywords, one per line')
+    p.add_argument('--startpage', type=int, default=1)
+    p.add_argument('--endpage', type=int, default=2)
+    p.add_argument('--root', default='data', help='root directory to save the news')
+    p.set_defaults(func=crawl)
+
+    # the options default to corpus.W2V_OPTS, so that corpus is not imported here
+    p = sub.add_parser('train', help='train the embedding models of the medias and the general model')
+    p.add_argument('--medias', nargs='+', default=['CNN', 'nypost'])
+    p.add_argument('--root', default='data', help='root directory of the collected news')
+    p.add_argument('--out', default='models', help='directory to save the models to')
+    p.add_argument('--workers', type=int, help='processes to tokenize the news, all the cpus by default')
+    for name in ['dims', 'window', 'n_cpu', 'min_count', 'vocab_size', 'n_iter']:
+        p.add_argument(f'--{name.replace("_", "-")}', dest=name, type=int)
+    p.add_argument('--sample', type=float)
+    p.set_defaults(func=train)
+
+    p = sub.add_parser('align', help='align the CNN and nypost models to the general model')
+    p.add_argument('--models', default='models', help='directory of the models, the results are saved there too')
+    p.add_argument('--clusters', type=int, default=300, help='number of content clusters')
+    p.set_defaults(func=align)
+
+    p = sub.add_parser('analyze', help='compare topics between CNN and nypost')
+    p.add_argument('--topics', nargs='+')
+    p.add_argument('--topics-file', help='file of topics, one per line')
+    p.add_argument('--models', default='models', help='directory of the models')
+    p.add_argument('--root', default='./data', help='root directory of the collected news')
+    p.add_argument('--cache', default='cache/topics', help='directory to cache the results')
+    p.add_argument('--workers', type=int, default=2,
+                   help='processes to run the topics, each loads its own copy of the models, -1 for all the cpus')
+    p.add_argument('--shift', action='store_true', help='average the semantic shift table saved by align')
+    p.add_argument('--out', default='topics.csv', help='csv file to write the results to')
+    p.set_defaults(func=analyze)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if args.metrics or args.profile:
+        from telemetry import configure
+        profile = True if args.profile == 'all' else [s for s in (args.profile or '').split(',') if s]
+        configure(args.metrics, profile, args.profile_dir)
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import numpy as np
+
+# vocabularies larger than this are clustered with MiniBatchKMeans by default
+MINIBATCH_SIZE = 50000
+
+# number of content clusters of the study, also of the legacy t_align dictionaries
+N_CLUSTERS = 300
+
+
+class ContentClusters(object):
+    '''
+    Content clusters of the words of an embedding model, i.e. the general content
+    units in newspaper discourse. The cluster ids are stored as a dense int16 array
+    aligned to the model vocabulary, so that the tokens of the articles are assigned
+    to their clusters in batches with array lookups.
+
+    Parameters
+    ----------
+    vocab: list, the words of the model vocabulary, in the order of their ids
+    labels: np.ndarray, int16 cluster id of each word aligned to vocab, -1 if not clustered
+    n_clusters: int, number of clusters, by default the largest cluster id plus one
+
+    w2id: dict, map from the words to their ids
+    '''
+    def __init__(self, vocab, labels, n_clusters=None):
+        self.vocab = list(vocab)
+        self.w2id = {w: i for i, w in enumerate(self.vocab)}
+        self.labels = np.asarray(labels, dtype=np.int16)
+        self.n_clusters = int(self.labels.max()) + 1 if n_clusters is None else n_clusters
+
+    @classmethod
+    def fit(cls, model, stopwords=(), n_clusters=N_CLUSTERS, minibatch=None, batch_size=4096, random_state=None):
+        '''
+        Cluster the words of a Word2Vec model except the stopwords by their vectors.
+        MiniBatchKMeans is used if minibatch, or by default when there are more
+        than MINIBATCH_SIZE words to cluster.
+        '''
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+
+        vocab = list(model.wv.index_to_key)
+        keep = np.array([w not in stopwords for w in vocab])
+        mtx = model.wv.vectors[keep]
+        if minibatch is None:
+            minibatch = len(mtx) > MINIBATCH_SIZE
+        if minibatch:
+            clustering = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=random_state)
+        else:
+            clustering = KMeans(n_clusters=n_clusters, random_state=random_state)
+        clustering.fit(mtx)
+        labels = np.full(len(vocab), -1, dtype=np.int16)
+        labels[keep] = clustering.labels_
+        return cls(vocab, labels, n_clusters)
+
+    @classmethod
+    def from_dict(cls, t_align, n_clusters=N_CLUSTERS):
+        '''
+        build the clusters from a word -> cluster id dictionary, the number of clusters is
+        not inferred from the ids since the last clusters may have no words in the dictionary
+        '''
+        return cls(list(t_align), np.fromiter(t_align.values(), dtype=np.int16, count=len(t_align)), n_clusters)
+
+    def lookup(self, tokens):
+        """
+        [STRING] -> ARRAY
+        Vocabulary ids of the tokens, -1 for unknown tokens.
+        """
+        get = self.w2id.get
+        return np.fromiter((get(w, -1) for w in tokens), dtype=np.int64, count=len(tokens))
+
+    def labels_of(self, ids):
+        """
+        ARRAY -> ARRAY
+        Cluster ids of vocabulary ids, -1 for unknown or not clustered words.
+        """
+        return np.where(ids >= 0, self.labels[ids], -1).astype(np.int16)
+
+    def assign(self, tokens):
+        """
+        [STRING] -> ARRAY
+        Cluster ids of the tokens, -1 for unknown or not clustered tokens.
+        """
+        return self.labels_of(self.lookup(tokens))
+
+    def coverage(self, tokens):
+        '''
+        count the tokens of each cluster
+        '''
+        labels = self.assign(tokens)
+        return np.bincount(labels[labels >= 0], minlength=self.n_clusters)
+
+    def groups(self):
+        '''
+        the words of each cluster, as {cluster id: [words]}
+        '''
+        res = {}
+        for w, c in zip(self.vocab, self.labels.tolist()):
+            if c >= 0:
+                res.setdefault(str(c), []).append(w)
+        return res
+
+    def to_dict(self):
+        '''
+        the clusters as a word -> cluster id dictionary, like t_align
+        '''
+        return {w: c for w, c in zip(self.vocab, self.labels.tolist()) if c >= 0}
+
+    def save(self, path):
+        '''
+        save the cluster id array and the vocabulary to a compressed .npz file
+        '''
+        np.savez_compressed(path,
+                            vocab=np.array(self.vocab, dtype=str),
+                            labels=self.labels,
+                            n_clusters=self.n_clusters)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        load the clusters saved by ContentClusters.save
+        '''
+        with np.load(path) as f:
+            return cls(f['vocab'].tolist(), f['labels'], int(f['n_clusters']))
@@ -0,0 +1,297 @@
+import glob
+import hashlib
+import os
+from multiprocessing import Pool
+
+import gensim
+import pandas as pd
+from gensim.utils import effective_n_jobs
+from nltk.tokenize import sent_tokenize
+
+from freq import FrequencyTable
+
+# default options of the embedding models, the same for the general and the media models
+W2V_OPTS = {'dims': 100,
+            'window': 5,
+            'n_cpu': -1,
+            'min_count': 30,
+            'vocab_size': 10000,
+            'sample': 0.0001,
+            'n_iter': 30
+            }
+
+
+def tokenize_text(text):
+    '''
+    Split a news text into sentences and tokenize each sentence the same way
+    the embedding models expect it.
+    '''
+    return [gensim.utils.simple_preprocess(st) for st in sent_tokenize(str(text))]
+
+
+def fingerprint(path):
+    '''
+    Get a cheap fingerprint of a file from its location, size and modification time,
+    so that a file is tokenized again only when it is changed.
+    '''
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def tokenize_file(job):
+    '''
+    Tokenize the texts of a csv file and cache the sentences on disk,
+    one sentence per line with the tokens separated by spaces, and save the
+    word frequencies of the file counted on the way.
+    The cache is written to a temporary file first so that an interrupted
+    run never leaves a partial cache behind.
+    '''
+    path, cache_path, freq_path, chunksize = job
+    tmp = f'{cache_path}.{os.getpid()}.tmp'
+    table = FrequencyTable()
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for chunk in pd.read_csv(path, usecols=['text'], chunksize=chunksize):
+            sentences = [tokens for text in chunk['text'].dropna() for tokens in tokenize_text(text) if tokens]
+            f.writelines(' '.join(tokens) + '\n' for tokens in sentences)
+            table.update(sentences)
+    # np.savez adds .npz to names without it
+    table.save(f'{freq_path}.{os.getpid()}.tmp.npz')
+    os.replace(f'{freq_path}.{os.getpid()}.tmp.npz', freq_path)
+    os.replace(tmp, cache_path)
+    return path
+
+
+def build(corpora, workers=None):
+    '''
+    Tokenize the files of several corpora that are missing from the cache
+    in one pool of processes, one file per task.
+    '''
+    jobs = [job for corpus in corpora for job in corpus.jobs()]
+    todo = [job for job in jobs if not (os.path.exists(job[1]) and os.path.exists(job[2]))]
+    if todo:
+        with Pool(min(effective_n_jobs(workers or -1), len(todo))) as pool:
+            for path in pool.imap_unordered(tokenize_file, todo):
+                print(f'Tokenized {path}', flush=True)
+    for corpus in corpora:
+        corpus.clean()
+    return corpora
+
+
+class FileIndex(object):
+    '''
+    Index of the collected csv files by media and keyword, built with one scan
+    of each media directory, so that the files of a topic are found without
+    listing the directories again.
+
+    Parameters
+    ----------
+    root: str, root directory of the collected news
+    medias: list, medias to index, None to index all the directories under root
+
+    files: dict, {media: {keyword: csv file}}, keywords as they appear in the file names
+    '''
+    def __init__(self, root='data', medias=None):
+        self.root = root
+        if medias is None:
+            medias = sorted(entry.name for entry in os.scandir(root) if entry.is_dir())
+        self.files = {}
+        for media in medias:
+            prefix = f'{media}_'
+            self.files[media] = {entry.name[len(prefix):-len('.csv')]: entry.path
+                                 for entry in os.scandir(os.path.join(root, media))
+                                 if entry.name.startswith(prefix) and entry.name.endswith('.csv')}
+
+    def keywords(self, media):
+        '''
+        the keywords collected from the media
+        '''
+        return sorted(self.files.get(media, {}))
+
+    def find(self, media, keyword):
+        '''
+        Find the csv file of the media under the keyword. If there is no file of the
+        exact keyword, the first file whose keyword starts with it is used.
+        '''
+        files = self.files.get(media, {})
+        if keyword in files:
+            return files[keyword]
+        for kw in sorted(files):
+            if kw.startswith(keyword):
+                return files[kw]
+        raise FileNotFoundError(f'No file of {keyword} from {media} under {self.root}')
+
+
+class Corpus(object):
+    '''
+    A restartable stream of the tokenized sentences of the news collected from
+    a media under a set of keywords. Each csv file is tokenized once in parallel
+    and cached on disk, then every iteration reads the sentences lazily from the
+    cache, so the corpus can be passed to Word2Vec without holding it in memory.
+
+    Parameters
+    ----------
+    media: str, name of the news website
+    keywords: list, keywords of the news to include as they appear in the file names,
+        None to include all the keywords collected from the media
+    root: str, root directory of the collected news
+    cache: str, root directory to cache the tokenized sentences
+    workers: int, number of processes to tokenize the news, None to use all the cpus
+    chunksize: int, number of rows to read from a csv file at a time
+
+    The word frequencies of each file are counted while it is tokenized and
+    cached next to its sentences, so frequencies() only merges the cached tables.
+
+    files: list, csv files of the news included in the corpus
+    built: bool, whether all the files are tokenized and cached
+    '''
+    def __init__(self,
+                 media='CNN',
+                 keywords=None,
+                 root='data',
+                 cache='cache/corpus',
+                 workers=None,
+                 chunksize=1000):
+        self.media = media
+        self.keywords = keywords
+        self.root = root
+        self.cache = cache
+        self.workers = workers
+        self.chunksize = chunksize
+        self.files = self.find_files()
+        self.built = False
+
+    def find_files(self):
+        '''
+        Find the csv files of the media under the keywords
+        '''
+        files = FileIndex(self.root, [self.media]).files.get(self.media, {})
+        return [files[kw] for kw in sorted(files) if self.keywords is None or kw in self.keywords]
+
+    def cache_path(self, path):
+        '''
+        Get the location of the cached sentences of a csv file
+        '''
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache, self.media, f'{stem}.{fingerprint(path)[:12]}.txt')
+
+    def freq_path(self, path):
+        '''
+        Get the location of the cached word frequencies of a csv file
+        '''
+        return f'{os.path.splitext(self.cache_path(path))[0]}.freq.npz'
+
+    def jobs(self):
+        '''
+        Get the tokenizing tasks of the csv files, as (csv file, cache file, frequency file, chunksize)
+        '''
+        os.makedirs(os.path.join(self.cache, self.media), exist_ok=True)
+        return [(path, self.cache_path(path), self.freq_path(path), self.chunksize) for path in self.files]
+
+    def clean(self):
+        '''
+        Remove the caches of the older versions of the csv files
+        '''
+        for path in self.files:
+            current = [self.cache_path(path), self.freq_path(path)]
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for pattern in ['*.txt', '*.freq.npz']:
+                for old in glob.glob(os.path.join(self.cache, self.media, f'{glob.escape(stem)}.{pattern}')):
+                    if old not in current:
+                        os.remove(old)
+        self.built = True
+
+    def build(self):
+        '''
+        Tokenize the csv files missing from the cache
+        '''
+        build([self], self.workers)
+        return self
+
+    def frequencies(self):
+        '''
+        the word frequencies of the corpus, merged from the tables of its files
+        '''
+        if not self.built:
+            self.build()
+        table = FrequencyTable()
+        for path in self.files:
+            table.merge(FrequencyTable.load(self.freq_path(path)))
+        return table
+
+    def __iter__(self):
+        if not self.built:
+            self.build()
+        for path in self.files:
+            with open(self.cache_path(path), 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield line.split()
+
+    def __add__(self, other):
+        return Corpora([self]) + other
+
+
+class Corpora(object):
+    '''
+    Chain several corpora into one restartable stream without copying them,
+    e.g. the news of all the medias to train the general model.
+
+    Parameters
+    ----------
+    corpora: list, the corpora to chain
+    workers: int, number of processes to tokenize the news, None to use all the cpus
+    '''
+    def __init__(self, corpora, workers=None):
+        self.corpora = list(corpora)
+        self.workers = workers
+
+    def build(self):
+        '''
+        Tokenize the csv files of all the corpora missing from the cache in one pool
+        '''
+        build(self.corpora, self.workers)
+        return self
+
+    def frequencies(self):
+        '''
+        the word frequencies of all the corpora
+        '''
+        if not all(corpus.built for corpus in self.corpora):
+            self.build()
+        table = FrequencyTable()
+        for corpus in self.corpora:
+            table.merge(corpus.frequencies())
+        return table
+
+    def __iter__(self):
+        if not all(corpus.built for corpus in self.corpora):
+            self.build()
+        for corpus in self.corpora:
+            yield from corpus
+
+    def __add__(self, other):
+        others = other.corpora if isinstance(other, Corpora) else [other]
+        return Corpora(self.corpora + others, self.workers)
+
+
+def train_word2vec(sentences, path=None, **opts):
+    '''
+    Train a skip-gram Word2Vec model on a stream of sentences, and save it to path if given.
+    opts overrides the default options in W2V_OPTS.
+    '''
+    opts = {**W2V_OPTS, **opts}
+    model = gensim.models.Word2Vec(sentences=sentences,
+                                   vector_size=opts['dims'],
+                                   window=opts['window'],
+                                   workers=effective_n_jobs(opts['n_cpu']),
+                                   sg=1,
+                                   hs=0,
+                                   negative=5,
+                                   min_count=opts['min_count'],
+                                   max_final_vocab=opts['vocab_size'],
+                                   sample=opts['sample'],
+                                   epochs=opts['n_iter']
+                                   )
+    if path:
+        model.save(path)
+    return model
@@ -1,20 +1,19 @@
-from time import sleep
+from time import sleep, perf_counter
 import datetime as dt
 from newspaper import Article
+from newspaper.article import ArticleDownloadState, ArticleException
 import requests
 from bs4 import BeautifulSoup
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import pandas as pd
-from selenium import webdriver
-from nltk.corpus import stopwords
 from http.cookiejar import CookieJar as cj
 from urllib.parse import urlparse
-from tqdm import tqdm
 import os
 import gc
-import psutil
 import json
+import queue
+import threading
+import time
+from telemetry import metrics
 
 
 class SearchEngine(object):
@@ -33,7 +32,9 @@ class SearchEngine(object):
                  root='data',
                  limit1=10,
                  limit2=10,
-                 limit3=1000,):
+                 limit3=1000,
+                 batch_size=100,
+                 interval=5,):
         '''
         This class is responsible for getting news urls, parsing them, and saving them
          from different news websites and keywords.
@@ -50,6 +51,8 @@ class SearchEngine(object):
         limit1: int, number of times to revisit the page if failed, then skip the page
         limit2: int, number of times to visit next page if current page is empty, then stop the crawler
         limit3: int, total number of times to reparse the page if failed, then stop the crawler
+        batch_size: int, number of news to write to the csv file at a time
+        interval: float, longest time in seconds to keep parsed news before writing them
         filter_: dict, time filter for the news
         process: bool, whether to get the urls in debug
         parse: bool, whether to parse the urls in debug
@@ -72,10 +75,8 @@ class SearchEngine(object):
         urls: list, news urls
         domain: str, domain of the news website
         news: list of News object
-        texts: list, texts of the news
-        titles: list, titles of the news
-        publish_dates: list, publish dates of the news
-        mem: psutil.virtual_memory(), memory usage
+        writer: StreamWriter, background writer of the parsed news to the csv file
+        mem: float, resident memory of the process in MB at the last check
         num: int, number of news
         count: int, number of news urls parsed
         driver: webdriver, driver for selenium
@@ -139,9 +140,9 @@ class SearchEngine(object):
         self.sleep3 = sleep3
         self.domain = None
         self.news = []
-        self.texts = []
-        self.titles = []
-        self.publish_dates = []
+        self.writer = None
+        self.batch_size = batch_size
+        self.interval = interval
         self.root = root
         self.count = 0
         self.count1 = 0
@@ -150,7 +151,7 @@ class SearchEngine(object):
         self.limit1 = limit1
         self.limit2 = limit2
         self.limit3 = limit3
-        self.mem = psutil.virtual_memory()
+        self.mem = None
         self.num = 0
         # Here we do not use the webdriver as it is slow, but you can use it if you want
         # options = webdriver.ChromeOptions()
@@ -206,7 +207,6 @@ class SearchEngine(object):
         and then the URLs of a certain page can be obtained from self.info.
         '''
         self.page = page
-        print(f'Getting page {self.page} of {self.endpage} from {self.name}...', end='\r', flush=True)
 
         # define the url of the search page so that we can get the news urls from a specific search page
         self.info = {'time': f'https://time.com/search/?q={self.keyword}&page={self.page}',
@@ -237,13 +237,13 @@ class SearchEngine(object):
 
         # get the news urls from the search page with different methods
         if self.method == 'direct':
-            soup = BeautifulSoup(requests.get(self.info[self.name], **self.headers).text, 'lxml')
+            soup = BeautifulSoup(self.fetch(self.info[self.name]), 'lxml')
             if self.name in self.pre:
                 soup = soup.find('div', class_=self.pre[self.name])
             urls = [tag['href'] for tag in soup.select(f'a[class*="{self.loc[self.name]}"]')
                     if tag.has_attr('href')]
         elif self.method == 'api':
-            js = self.get_dict(self.get_json(requests.get(self.info[self.name], **self.headers).text))
+            js = self.get_dict(self.get_json(self.fetch(self.info[self.name])))
             if self.easy_json:
                 urls = list(map(lambda x: x[self.loc[self.name]], js))
             elif self.medium_json:
@@ -255,6 +255,8 @@ class SearchEngine(object):
             #     text = np.array(requests.get(self.info[self.name], **self.headers).text.split())
             #     urls = list(map(lambda x: x.strip('",'), text[np.where(text == '"link":')[0] + 1]))
         elif self.method == 's':
+            # selenium is only needed by the search pages rendered with javascript
+            from selenium import webdriver
             options = webdriver.ChromeOptions()
             options.add_argument('--ignore-certificate-errors')
             options.add_argument('--incognito')
@@ -272,6 +274,15 @@ class SearchEngine(object):
         except:
             return self.add_domain(urls)
 
+    def fetch(self, url):
+        '''
+        get the text of a search page and record the latency of the request
+        '''
+        start = perf_counter()
+        text = requests.get(url, **self.headers).text
+        metrics.observe('fetch_latency', perf_counter() - start, outlet=self.name, page='search')
+        return text
+
     def add_domain(self, urls):
         '''
         add the domain to the urls if needed
@@ -301,7 +312,8 @@ class SearchEngine(object):
         urls = []
         while self.page <= self.endpage:
             try:
-                urls = self.get_urls(self.page)
+                with metrics.stage('get_urls', outlet=self.name):
+                    urls = self.get_urls(self.page)
                 self.page += 1
                 self.count1 = 0
                 self.count2 = 0
@@ -316,6 +328,7 @@ class SearchEngine(object):
 
             # stop when the urls are empty for too many consecutive times
             if urls == []:
+                metrics.count('empty_pages', outlet=self.name)
                 sleep(self.sleep2)
                 self.count2 += 1
                 self.page += 1
@@ -326,21 +339,22 @@ class SearchEngine(object):
             self.urls.extend(urls)
 
         self.urls = sorted(list(set(self.urls)))
+        metrics.gauge('urls', len(self.urls), outlet=self.name, keyword=self.keyword)
 
     def parse(self):
         '''
         Get and parse the news from the news urls to get the titles, texts and publish dates
-        by using the News class.
+        by using the News class. Each parsed news is handed to the background writer
+        together with its url, which writes them to the csv file by batches.
         '''
+        from tqdm import tqdm
+
         print(f'Parsing {self.num} urls from {self.name}...', flush=True)
+        writer = self.open_writer()
 
         for url in tqdm(self.urls, colour='green'):
             try:
-                new = News(url)
-                self.count += 1
-                self.texts.append(new.text)
-                self.titles.append(new.title)
-                self.publish_dates.append(new.publish_date)
+                new = News(url, outlet=self.name)
             except:
                 sleep(self.sleep3)
                 self.count3 += 1
@@ -351,46 +365,44 @@ class SearchEngine(object):
                     print(f'Parsing {self.keyword} failed too many times!', flush=True)
                     print(f'{self.keyword} saved {self.count} results', flush=True)
                     break
+                continue
 
-            # save the results every 100 urls, then clean the memory
+            self.count += 1
+            writer.put((new.title, new.text, url, new.publish_date))
+            # check the memory every 100 news
             if self.count % 100 == 0:
-                self.save()
-                num = len(self.texts)
-                self.urls = self.urls[num:]
-                self.titles = []
-                self.texts = []
-                self.publish_dates = []
-                gc.collect()
                 self.get_system_memory()
-                print('-'*30, flush=True)
 
+        self.save()
         return None
 
     def get_system_memory(self):
         '''
-        get the system memory usage information
+        record the resident memory of the process
         '''
-        self.mem = psutil.virtual_memory()
-        print(f'Total memory: {self.mem.total/1024/1024/1024:.2f}GB, '
-              f'Used memory: {self.mem.used/1024/1024/1024:.2f}GB, '
-              f'Available memory: {self.mem.available/1024/1024/1024:.2f}GB',
-              flush=True)
+        self.mem = metrics.rss(outlet=self.name)
+        return self.mem
 
-    def save(self):
+    def open_writer(self):
         '''
-        save the results to a csv file
+        start the background writer of the news to the csv file, if not started yet
         '''
         # self.path = self.root + f'/{self.name}_{self.keyword}_page{self.startpage}to{self.endpage}' \
         #                         f'_time{self.filter_["begin_time"]}to{self.filter_["end_time"]}.csv'
         self.path = self.root + f'/{self.name}/{self.name}_{self.keyword}.csv'
+        if self.writer is None:
+            self.writer = StreamWriter(self.path, self.batch_size, self.interval, outlet=self.name).start()
+        return self.writer
 
-        df = pd.DataFrame({'title': self.titles,
-                           'text': self.texts,
-                           'url': self.urls[:len(self.texts)],
-                           'published_time': self.publish_dates})
-        # use mode='a' to append the data to the csv file
-        df.to_csv(self.path, mode='a', header=not os.path.exists(self.path), index=False)
-        print(f'Saved to {self.path}', flush=True)
+    def save(self):
+        '''
+        write the news left in the background writer to the csv file and stop the writer
+        '''
+        if self.writer is None:
+            return None
+        writer, self.writer = self.writer, None
+        writer.close()
+        print(f'Saved {writer.count} news to {self.path}', flush=True)
 
     def remove_dupna(self):
         '''
@@ -417,11 +429,9 @@ class SearchEngine(object):
         self.count2 = 0
         self.count3 = 0
         self.count = 0
+        self.save()
         self.urls = []
         self.news = []
-        self.titles = []
-        self.texts = []
-        self.publish_dates = []
         self.page = self.startpage
         self.set_method()
         gc.collect()
@@ -447,6 +457,110 @@ class SearchEngine(object):
                 print('\n', flush=True)
 
 
+class StreamWriter(object):
+    '''
+    Write the news to a csv file from a background thread, so that writing overlaps
+    with fetching and the memory stays flat. Complete (title, text, url, date) records
+    are fed through a bounded queue and appended by batches of batch_size records or
+    every interval seconds, each batch with a single write to the end of the file.
+
+    Parameters
+    ----------
+    path: str, the csv file to append the news to
+    batch_size: int, number of records to write at a time
+    interval: float, longest time in seconds to keep records before writing them
+    maxsize: int, capacity of the queue, put blocks when the writer falls behind
+    outlet: str, name of the news website for the metrics
+
+    queue: queue.Queue, the records waiting to be written
+    thread: threading.Thread, the writer thread
+    count: int, number of records written
+    error: Exception, the error that stopped the writer
+    '''
+    columns = ['title', 'text', 'url', 'published_time']
+
+    def __init__(self, path, batch_size=100, interval=5, maxsize=1000, outlet=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.outlet = outlet
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.count = 0
+        self.error = None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, record):
+        '''
+        add a (title, text, url, date) record to write
+        '''
+        if self.error:
+            raise self.error
+        self.queue.put(record)
+
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                record = ()
+            done = record is None
+            if record:
+                batch.append(record)
+            if batch and (done or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval
+            if done:
+                return
+
+    def flush(self, batch):
+        '''
+        append a batch of records to the csv file with a single write
+        '''
+        if self.error:
+            return
+        try:
+            with metrics.stage('save', outlet=self.outlet):
+                header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                data = pd.DataFrame(batch, columns=self.columns).to_csv(index=False, header=header).encode('utf-8')
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(fd, view):]
+                finally:
+                    os.close(fd)
+            self.count += len(batch)
+            metrics.count('saved', len(batch), outlet=self.outlet)
+        except Exception as e:
+            self.error = e
+
+    def close(self):
+        '''
+        write the records left and stop the writer, leaving a file with only the header
+        if there was no record to write
+        '''
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        if not os.path.exists(self.path):
+            pd.DataFrame(columns=self.columns).to_csv(self.path, index=False)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class News(Article):
     '''
     the class to parse the news from the url to get the title, text and publish date.
@@ -455,14 +569,23 @@ class News(Article):
     Parameters
     ----------
     url: str, the url of the news
+    outlet: str, name of the news website for the metrics, by default the domain of the url
     publish_date: str, the published date of the news
     title: str, the title of the news
     text: str, the body text of the news
     '''
-    def __init__(self, url):
+    def __init__(self, url, outlet=None):
         super().__init__(url)
-        self.download()
-        self.parse()
+        outlet = outlet or urlparse(url).netloc
+        with metrics.stage('news.download', outlet=outlet):
+            start = perf_counter()
+            self.download()
+            metrics.observe('fetch_latency', perf_counter() - start, outlet=outlet, page='article')
+            # download does not raise on a failed request, so that it would fail in parse instead
+            if self.download_state == ArticleDownloadState.FAILED_RESPONSE:
+                raise ArticleException(f'Failed to download {url}: {self.download_exception_msg}')
+        with metrics.stage('news.parse', outlet=outlet):
+            self.parse()
         try:
             self.publish_date = self.publish_date.strftime('%Y-%m-%d')
         except:
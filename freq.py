@@ -0,0 +1,160 @@
+import json
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+
+
+class FrequencyTable(object):
+    '''
+    Word frequencies of a corpus, stored as a vocabulary and an array of counts
+    aligned to it. Tokens are counted with a Counter, which only holds the distinct
+    words, and only the distinct words are encoded to integer ids, so new articles
+    can be added to a table at any time, and tables of different medias are merged
+    by adding their count arrays.
+
+    Parameters
+    ----------
+    vocab: list, the words of the table, in the order of their ids
+    counts: np.ndarray, the count of each word, aligned to vocab
+
+    w2id: dict, map from the words to their ids
+    '''
+    def __init__(self, vocab=None, counts=None):
+        self.vocab = list(vocab) if vocab is not None else []
+        self.w2id = {w: i for i, w in enumerate(self.vocab)}
+        if counts is None:
+            self.counts = np.zeros(len(self.vocab), dtype=np.int64)
+        else:
+            self.counts = np.asarray(counts, dtype=np.int64)
+
+    @property
+    def total(self):
+        '''
+        total number of tokens counted
+        '''
+        return int(self.counts.sum())
+
+    def encode(self, words, grow=False):
+        """
+        [STRING] -> ARRAY
+        Unknown words are added to the vocabulary if grow, else encoded as -1.
+        """
+        if grow:
+            for w in words:
+                if w not in self.w2id:
+                    self.w2id[w] = len(self.vocab)
+                    self.vocab.append(w)
+            if len(self.vocab) > len(self.counts):
+                self.counts = np.concatenate([self.counts,
+                                              np.zeros(len(self.vocab) - len(self.counts), dtype=np.int64)])
+        return np.fromiter((self.w2id.get(w, -1) for w in words), dtype=np.int64, count=len(words))
+
+    def add_ids(self, ids):
+        '''
+        add the counts of an array of word ids
+        '''
+        self.counts += np.bincount(ids, minlength=len(self.counts))
+        return self
+
+    def add_tokens(self, tokens):
+        '''
+        add the counts of a batch of tokens
+        '''
+        return self.add_counts(Counter(tokens))
+
+    def add_counts(self, counts):
+        '''
+        add the counts of a word -> count mapping, e.g. a Counter
+        '''
+        if not counts:
+            return self
+        ids = self.encode(list(counts), grow=True)
+        self.counts[ids] += np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        return self
+
+    def update(self, sentences):
+        '''
+        add the counts of a stream of tokenized sentences, e.g. a corpus.Corpus
+        '''
+        return self.add_counts(Counter(chain.from_iterable(sentences)))
+
+    def merge(self, other):
+        '''
+        add the counts of another table to this table
+        '''
+        ids = self.encode(other.vocab, grow=True)
+        self.counts[ids] += other.counts
+        return self
+
+    def copy(self):
+        return FrequencyTable(self.vocab, self.counts.copy())
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def __radd__(self, other):
+        # so that sum() can merge a list of tables
+        if other == 0:
+            return self.copy()
+        return NotImplemented
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __contains__(self, word):
+        return word in self.w2id
+
+    def __getitem__(self, word):
+        return self.get(word)
+
+    def get(self, word, default=0):
+        idx = self.w2id.get(word)
+        return default if idx is None else int(self.counts[idx])
+
+    def lookup(self, words):
+        """
+        [STRING] -> ARRAY
+        Counts of the words, 0 for unknown words.
+        """
+        ids = self.encode(words)
+        if not len(self.counts):
+            return np.zeros(len(ids), dtype=np.int64)
+        return np.where(ids >= 0, self.counts[ids], 0)
+
+    def most_common(self, n=None):
+        '''
+        the n most frequent words with their counts, in descending order
+        '''
+        order = np.argsort(self.counts, kind='stable')[::-1][:n]
+        return [(self.vocab[i], int(self.counts[i])) for i in order]
+
+    def to_dict(self):
+        return dict(zip(self.vocab, self.counts.tolist()))
+
+    def save(self, path):
+        '''
+        save the table to a compressed .npz file
+        '''
+        np.savez_compressed(path, vocab=np.array(self.vocab, dtype=str), counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        load a table saved by FrequencyTable.save
+        '''
+        with np.load(path) as f:
+            return cls(f['vocab'].tolist(), f['counts'])
+
+    @classmethod
+    def from_json(cls, path):
+        '''
+        load a table from the json word frequency files, where the total is stored under key "0"
+        '''
+        with open(path, 'r') as f:
+            counts = json.load(f)
+        counts.pop('0', None)
+        return cls(list(counts), np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
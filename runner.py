@@ -0,0 +1,152 @@
+import hashlib
+import glob
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+
+import gensim
+import pandas as pd
+from gensim.utils import effective_n_jobs
+
+from align import research_topic
+from cluster import ContentClusters
+from corpus import FileIndex, fingerprint
+from shift import SemanticShift
+from telemetry import metrics
+
+# resources loaded once in each worker process
+_worker = {}
+
+# default number of worker processes, each holds its own copy of the models
+WORKERS = 2
+
+
+def file_hash(path, chunk=1 << 20):
+    '''
+    Hash the content of a file together with its companion files,
+    e.g. the .npy arrays gensim saves next to a large model.
+    '''
+    sha = hashlib.sha1()
+    for name in [path] + sorted(glob.glob(f'{glob.escape(path)}.*')):
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(chunk), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+
+def load_resource(name, path):
+    '''
+    Load a resource of research_topic by its argument name: the content clusters (t_align),
+    the semantic shift table (shift), a Word2Vec model (.model) or a pickled object, e.g. an aligner
+    '''
+    if name == 't_align' and path.endswith('.npz'):
+        return ContentClusters.load(path)
+    if name == 'shift':
+        return SemanticShift.load(path)
+    if path.endswith('.model'):
+        return gensim.models.Word2Vec.load(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def init_worker(paths, index, telemetry):
+    '''
+    Load the models, aligners and clusters once per worker process.
+    The metrics are configured as in the parent process, and written when the
+    worker exits since the pool workers do not run the atexit handlers.
+    '''
+    metrics.configure(*telemetry)
+    Finalize(None, metrics.close, exitpriority=10)
+    _worker['resources'] = {name: load_resource(name, path) for name, path in paths.items()}
+    # the pickled aligners carry their source and target models, research_topic only needs their matrices
+    for name in ['forward_cnn', 'forward_nypost']:
+        _worker['resources'][name].src = _worker['resources'][name].tgt = None
+    _worker['index'] = index
+
+
+def run_topic(keywords):
+    return research_topic(keywords, **_worker['resources'], index=_worker['index'])
+
+
+class TopicRunner(object):
+    '''
+    Run research_topic for many topics across a pool of processes. The results are
+    cached by the fingerprints of the topic files and the hashes of the models, so that
+    only the topics whose news or models changed are computed again.
+
+    Parameters
+    ----------
+    paths: dict, files of the resources of research_topic, keyed by its arguments:
+        t_align, forward_cnn, forward_nypost, model_general, model_cnn, model_nypost,
+        and optionally shift, a saved shift.SemanticShift table of the models
+    root: str, root directory of the collected news
+    cache: str, directory to cache the results
+    workers: int, number of processes, -1 to use all the cpus. Each process loads its own copy
+        of the three models and the two aligners, whose pickles also carry the models they align,
+        so the memory grows with about seven model copies per process while they are loaded.
+
+    index: corpus.FileIndex, index of the CNN and nypost files
+    hashes: dict, content hashes of the resource files
+    '''
+    def __init__(self, paths, root='./data', cache='cache/topics', workers=WORKERS):
+        self.paths = dict(paths)
+        self.root = root
+        self.cache = cache
+        self.workers = workers
+        self.index = FileIndex(root, ['CNN', 'nypost'])
+        self.hashes = {name: file_hash(path) for name, path in sorted(self.paths.items())}
+
+    def key(self, keywords):
+        '''
+        the cache key of a topic, from its file fingerprints and the model hashes
+        '''
+        files = [fingerprint(self.index.find(media, keywords)) for media in ['CNN', 'nypost']]
+        return hashlib.sha1(repr((keywords, files, sorted(self.hashes.items()))).encode()).hexdigest()
+
+    def cache_path(self, keywords):
+        return os.path.join(self.cache, f'{self.key(keywords)}.pkl')
+
+    def run(self, topics):
+        '''
+        Get the results of research_topic for the topics, in the same order
+        '''
+        os.makedirs(self.cache, exist_ok=True)
+        results = {}
+        todo = []
+        for t in topics:
+            path = self.cache_path(t)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    results[t] = pickle.load(f)
+            elif t not in todo:
+                todo.append(t)
+
+        if todo:
+            print(f'Computing {len(todo)} of {len(topics)} topics...', flush=True)
+            with ProcessPoolExecutor(min(effective_n_jobs(self.workers), len(todo)),
+                                     initializer=init_worker,
+                                     initargs=(self.paths, self.index,
+                                               (metrics.path, metrics.profile, metrics.profile_dir))) as pool:
+                for t, res in zip(todo, pool.map(run_topic, todo)):
+                    # write to a temporary file first so that an interrupted run leaves no partial cache
+                    path = self.cache_path(t)
+                    with open(f'{path}.tmp', 'wb') as f:
+                        pickle.dump(res, f)
+                    os.replace(f'{path}.tmp', path)
+                    results[t] = res
+                    print(f'{t} done', flush=True)
+
+        return [results[t] for t in topics]
+
+    def table(self, topics):
+        '''
+        Get the results of the topics as a dataframe indexed by topic
+        '''
+        t_js_list, t_cos_list, mean_list, t_cnn, t_nypost = zip(*self.run(topics))
+        return pd.DataFrame({'mean_simi': mean_list,
+                             'JS_div': t_js_list,
+                             'Cos_div': t_cos_list,
+                             't_cnn': t_cnn,
+                             't_nypost': t_nypost},
+                            index=topics)
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import normalize
+
+
+def top_k(query, target, k):
+    '''
+    ids of the k nearest target rows of each query row by cosine similarity,
+    both matrices should be normalized
+    '''
+    sims = query.dot(target.T)
+    return np.argpartition(-sims, k - 1, axis=1)[:, :k]
+
+
+class SemanticShift(object):
+    '''
+    Semantic shift of the whole shared vocabulary of two media models, aligned onto
+    the same general space. Every shared word is projected once, in chunks of matrix
+    operations, and scored by:
+    similarity: cosine similarity of the word between the two models translated by
+        translate_mtx, the measure research_topic averages over the words of a topic
+    general_similarity: cosine similarity of the word between the two models, both mapped
+        into the space of the general model by to_target
+    overlap: share of the k nearest general words of the word that both aligned models agree on
+    The table is ranked by shift, i.e. 1 - general_similarity, in descending order, so that
+    topic scores are weighted lookups into it.
+
+    Parameters
+    ----------
+    words: list, the shared words
+    similarity: np.ndarray, cosine similarity of each word, aligned to words
+    general_similarity: np.ndarray, cosine similarity in the general space of each word, aligned to words
+    overlap: np.ndarray, neighbor overlap of each word, aligned to words
+    k: int, number of neighbors of the overlap
+
+    w2id: dict, map from the words to their ids
+    '''
+    def __init__(self, words, similarity, general_similarity, overlap, k=10):
+        order = np.argsort(np.asarray(general_similarity), kind='stable')
+        self.words = [words[i] for i in order]
+        self.w2id = {w: i for i, w in enumerate(self.words)}
+        self.similarity = np.asarray(similarity, dtype=np.float64)[order]
+        self.general_similarity = np.asarray(general_similarity, dtype=np.float64)[order]
+        self.overlap = np.asarray(overlap, dtype=np.float64)[order]
+        self.k = k
+
+    @property
+    def shift(self):
+        return 1 - self.general_similarity
+
+    @classmethod
+    def compute(cls, forward_a, forward_b, model_a, model_b, model_general=None, k=10, chunk_size=4096):
+        '''
+        Score the words shared by model_a, model_b and model_general if given, where
+        forward_a and forward_b align model_a and model_b onto the same general model.
+        '''
+        words = [w for w in model_a.wv.index_to_key if w in model_b.wv.key_to_index
+                 and (model_general is None or w in model_general.wv.key_to_index)]
+        target_a = normalize(forward_a.target_mtx())
+        target_b = normalize(forward_b.target_mtx())
+        if target_a.shape[0] != target_b.shape[0]:
+            raise ValueError('The aligners should align onto the same general model')
+        k = min(k, target_a.shape[0])
+
+        similarity = np.zeros(len(words), dtype=np.float64)
+        general_similarity = np.zeros(len(words), dtype=np.float64)
+        overlap = np.zeros(len(words), dtype=np.float64)
+        for start in range(0, len(words), chunk_size):
+            chunk = words[start:start + chunk_size]
+            mtx_a = model_a.wv[chunk]
+            mtx_b = model_b.wv[chunk]
+            sims = normalize(forward_a.translate_mtx(mtx_a)) * normalize(forward_b.translate_mtx(mtx_b))
+            similarity[start:start + len(chunk)] = sims.sum(axis=1)
+            sims = normalize(forward_a.to_target(mtx_a)) * normalize(forward_b.to_target(mtx_b))
+            general_similarity[start:start + len(chunk)] = sims.sum(axis=1)
+            near_a = top_k(normalize(forward_a.project(mtx_a)), target_a, k)
+            near_b = top_k(normalize(forward_b.project(mtx_b)), target_b, k)
+            shared = (near_a[:, :, None] == near_b[:, None, :]).any(axis=2)
+            overlap[start:start + len(chunk)] = shared.sum(axis=1) / k
+        return cls(words, similarity, general_similarity, overlap, k)
+
+    def lookup(self, words):
+        """
+        [STRING] -> ARRAY
+        Ids of the words in the table, -1 for words not shared.
+        """
+        return np.fromiter((self.w2id.get(w, -1) for w in words), dtype=np.int64, count=len(words))
+
+    def score(self, words, weights=None, measure='similarity'):
+        '''
+        Weighted average of a measure over the words of a topic, the words not shared are ignored.
+        With the sentence counts of the words as weights, the similarity equals
+        the mean similarity of research_topic.
+        The score is nan when no word of the topic is shared.
+        '''
+        ids = self.lookup(words)
+        keep = ids >= 0
+        weights = np.ones(keep.sum()) if weights is None else np.asarray(weights, dtype=np.float64)[keep]
+        if weights.sum() == 0:
+            return np.nan
+        return np.average(getattr(self, measure)[ids[keep]], weights=weights)
+
+    def to_frame(self):
+        '''
+        the ranked table as a dataframe
+        '''
+        return pd.DataFrame({'word': self.words,
+                             'similarity': self.similarity,
+                             'general_similarity': self.general_similarity,
+                             'shift': self.shift,
+                             'overlap': self.overlap})
+
+    def save(self, path):
+        '''
+        save the ranked table to a compressed .npz file
+        '''
+        np.savez_compressed(path,
+                            words=np.array(self.words, dtype=str),
+                            similarity=self.similarity,
+                            general_similarity=self.general_similarity,
+                            overlap=self.overlap,
+                            k=self.k)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        load a table saved by SemanticShift.save
+        '''
+        with np.load(path) as f:
+            return cls(f['words'].tolist(), f['similarity'], f['general_similarity'], f['overlap'], int(f['k']))
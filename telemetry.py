@@ -0,0 +1,202 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+
+class Telemetry(object):
+    '''
+    Performance metrics of the pipeline: per-stage timers, process RSS gauges,
+    latency histograms and success/failure counters. Every metric is appended
+    as one json line to a metrics file, so a slow run can be split into network,
+    parsing and disk time afterwards. Stages can also be profiled with cProfile,
+    the profile of each stage is accumulated over its calls and saved at exit.
+
+    Parameters
+    ----------
+    path: str, json-lines file to append the metrics to, None to only keep them in memory
+    profile: bool or list, stages to profile, True for all the stages
+    profile_dir: str, directory to save the cProfile .prof files to
+
+    counters: dict, running total of each (counter, labels)
+    histograms: dict, observations of each (histogram, labels)
+    profiles: dict, cProfile.Profile of each profiled stage
+    registered: bool, whether close is registered to run at exit
+    process: psutil.Process, this process, created on the first RSS check
+    '''
+    def __init__(self, path=None, profile=False, profile_dir='profiles'):
+        self.path = None
+        self.profile = False
+        self.profile_dir = profile_dir
+        self.counters = {}
+        self.histograms = {}
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.process = None
+        self.registered = False
+        self.configure(path, profile, profile_dir)
+
+    def configure(self, path=None, profile=False, profile_dir='profiles'):
+        '''
+        Set where the metrics are written to and which stages are profiled
+        '''
+        self.path = path
+        self.profile = profile
+        self.profile_dir = profile_dir
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if (path or profile) and not self.registered:
+            atexit.register(self.close)
+            self.registered = True
+        return self
+
+    def emit(self, kind, name, value, **labels):
+        '''
+        write a metric as a json line
+        '''
+        if not self.path:
+            return
+        line = json.dumps({'ts': time.time(), 'pid': os.getpid(), 'type': kind,
+                           'name': name, 'value': value, 'labels': labels}, default=str)
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    def count(self, name, value=1, **labels):
+        '''
+        add to a counter, e.g. the successes and failures of a stage
+        '''
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            total = self.counters[key]
+        self.emit('counter', name, total, **labels)
+        return total
+
+    def gauge(self, name, value, **labels):
+        '''
+        record the current value of a measure
+        '''
+        self.emit('gauge', name, value, **labels)
+        return value
+
+    def observe(self, name, value, **labels):
+        '''
+        add an observation to a histogram, e.g. the latency of a fetch
+        '''
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.histograms.setdefault(key, []).append(value)
+        self.emit('observation', name, value, **labels)
+        return value
+
+    def rss(self, **labels):
+        '''
+        record the resident memory of this process in MB
+        '''
+        if self.process is None:
+            import psutil
+            self.process = psutil.Process()
+        return self.gauge('rss_mb', self.process.memory_info().rss / 1024 / 1024, **labels)
+
+    def profiling(self, name):
+        return self.profile is True or (bool(self.profile) and name in self.profile)
+
+    @contextmanager
+    def stage(self, name, **labels):
+        '''
+        Time a stage, count its successes and failures, and record the RSS after it.
+        The stage is profiled if configured, unless another stage is profiled in this thread already.
+        '''
+        profiler = None
+        if self.profiling(name) and not getattr(self.local, 'profiling', False):
+            with self.lock:
+                profiler = self.profiles.setdefault(name, cProfile.Profile())
+            self.local.profiling = True
+            profiler.enable()
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.local.profiling = False
+            self.emit('timer', name, elapsed, status=status, **labels)
+            self.count(f'{name}.{status}', **labels)
+            if self.path:
+                self.rss(stage=name, **labels)
+
+    def timed(self, name):
+        '''
+        decorator to run a function as a stage
+        '''
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        '''
+        Summarize the histograms by count, mean, percentiles and buckets,
+        as {name: [{labels, count, mean, p50, p95, max, buckets}]}
+        '''
+        import numpy as np
+
+        res = {}
+        with self.lock:
+            items = [(key, np.array(values)) for key, values in self.histograms.items()]
+        for (name, labels), values in items:
+            counts = np.histogram(values, bins=(0,) + BUCKETS)[0]
+            res.setdefault(name, []).append({'labels': dict(labels),
+                                             'count': len(values),
+                                             'mean': float(values.mean()),
+                                             'p50': float(np.percentile(values, 50)),
+                                             'p95': float(np.percentile(values, 95)),
+                                             'max': float(values.max()),
+                                             'buckets': dict(zip(map(str, BUCKETS), counts.tolist()))})
+        return res
+
+    def flush(self):
+        '''
+        write the summary of the histograms
+        '''
+        for name, rows in self.summary().items():
+            for row in rows:
+                self.emit('histogram', name, {k: v for k, v in row.items() if k != 'labels'}, **row['labels'])
+
+    def close(self):
+        '''
+        write the summary of the histograms and save the profiles, called at exit
+        '''
+        self.flush()
+        self.dump_profiles()
+
+    def dump_profiles(self):
+        '''
+        save the profile of each profiled stage to profile_dir
+        '''
+        if self.profiles:
+            os.makedirs(self.profile_dir, exist_ok=True)
+        for name, profiler in self.profiles.items():
+            profiler.dump_stats(os.path.join(self.profile_dir, f'{name}.{os.getpid()}.prof'))
+
+
+# the metrics of this process, configure it to write them to a file
+metrics = Telemetry()
+configure = metrics.configure
@@ -0,0 +1,128 @@
+import os
+import types
+from collections import Counter
+
+import gensim
+import numpy as np
+import pandas as pd
+import pytest
+from gensim.models import KeyedVectors
+from nltk.tokenize import sent_tokenize
+from sklearn.metrics.pairwise import cosine_similarity
+
+from align import JS_divergence, SVDAligner, get_cca_aligner, research_topic
+from cluster import ContentClusters
+from corpus import FileIndex, tokenize_text
+from shift import SemanticShift
+
+WORDS = ['gun', 'law', 'police', 'war', 'crime', 'vote', 'court', 'border', 'city', 'state',
+         'senate', 'house', 'school', 'shooting', 'rights', 'ban', 'officer', 'protest', 'bill', 'judge']
+STOP = ['the', 'a', 'of', 'and', 'to', 'in']
+
+
+@pytest.fixture(scope='module')
+def punkt():
+    try:
+        tokenize_text('One sentence. Another one.')
+    except LookupError:
+        pytest.skip('the nltk punkt tokenizer data is not installed')
+
+
+def make_news(rng, n):
+    texts = []
+    for _ in range(n):
+        sentences = [' '.join(rng.choice(WORDS + STOP, rng.integers(3, 12))).capitalize() + '.'
+                     for _ in range(rng.integers(1, 6))]
+        texts.append(' '.join(sentences) + ' Unknownword!')
+    return pd.DataFrame({'title': ['title'] * n, 'text': texts})
+
+
+@pytest.fixture
+def topic(tmp_path, punkt):
+    rng = np.random.default_rng(0)
+    for media in ['CNN', 'nypost']:
+        os.makedirs(tmp_path / media)
+        make_news(rng, 30).to_csv(tmp_path / media / f'{media}_gun.csv', index=False)
+    vocab = WORDS + STOP + ['unknownword']
+    models = []
+    for _ in range(3):
+        kv = KeyedVectors(20)
+        kv.add_vectors(vocab, rng.normal(size=(len(vocab), 20)).astype(np.float32))
+        models.append(types.SimpleNamespace(wv=kv))
+    aligners = []
+    for _ in range(2):
+        aligner = SVDAligner('svd', None, None, {}, {}, None, None, [])
+        aligner.set_params(np.linalg.qr(rng.normal(size=(20, 20)))[0])
+        aligners.append(aligner)
+    t_align = {w: int(c) for w, c in zip(WORDS, rng.integers(0, 300, len(WORDS)))}
+    return str(tmp_path), t_align, aligners, models
+
+
+def reference_research_topic(root, t_align, forward_cnn, forward_nypost, model_general, model_cnn, model_nypost):
+    '''
+    the loop implementation research_topic replaced
+    '''
+    word_intersec = []
+    t_vecs = []
+    for media in ['CNN', 'nypost']:
+        t_vec = np.zeros(300)
+        df = pd.read_csv(os.path.join(root, media, f'{media}_gun.csv'))
+        total = 0
+        for idx, row in df.iterrows():
+            for st in sent_tokenize(str(row['text'])):
+                hist = Counter(gensim.utils.simple_preprocess(st))
+                for k in hist:
+                    num = t_align.get(k, -1)
+                    if num >= 0:
+                        word_intersec.append(k)
+                        total += hist[k]
+                        t_vec[num] += hist[k]
+        t_vecs.append(t_vec / total)
+    t_vec_cnn, t_vec_nypost = t_vecs
+    topic_js = JS_divergence(t_vec_nypost, t_vec_cnn)
+    topic_cos = cosine_similarity(t_vec_nypost.reshape([1, -1]), t_vec_cnn.reshape([1, -1]))
+
+    dis = []
+    for wd in word_intersec:
+        if wd in model_general.wv.key_to_index and wd in model_cnn.wv.key_to_index:
+            vec_nypost = forward_nypost.translate_mtx(model_nypost.wv[wd])
+            vec_cnn = forward_cnn.translate_mtx(model_cnn.wv[wd])
+            dis.append(cosine_similarity(vec_nypost.reshape([1, -1]), vec_cnn.reshape([1, -1])))
+    return topic_js, topic_cos, np.mean(np.array(dis)), t_vec_cnn, t_vec_nypost
+
+
+@pytest.mark.parametrize('clusters', ['dict', 'array'])
+def test_research_topic_matches_reference(topic, clusters):
+    root, t_align, aligners, models = topic
+    expected = reference_research_topic(root, t_align, *aligners, *models)
+    if clusters == 'array':
+        t_align = ContentClusters.from_dict(t_align)
+    result = research_topic('gun', t_align, *aligners, *models, index=FileIndex(root, ['CNN', 'nypost']))
+    assert len(result[3]) == len(result[4]) == 300
+    for res, exp in zip(result, expected):
+        assert np.allclose(res, exp)
+
+
+def test_research_topic_without_shared_words(topic):
+    root, t_align, aligners, models = topic
+    # the clustered words are missing from the models
+    t_align = {f'{w}s': c for w, c in t_align.items()}
+    for media in ['CNN', 'nypost']:
+        path = os.path.join(root, media, f'{media}_gun.csv')
+        df = pd.read_csv(path)
+        df['text'] = df['text'].str.replace(r'(\w+)', r'\1s', regex=True)
+        df.to_csv(path, index=False)
+    result = research_topic('gun', t_align, *aligners, *models, root=root)
+    assert np.isnan(result[2])
+
+
+def test_research_topic_with_shift_table(topic):
+    root, t_align, _, models = topic
+    model_general, model_cnn, model_nypost = models
+    # with CCA aligners, translate_mtx and to_target differ
+    anchors = sorted(model_general.wv.key_to_index)
+    aligners = [get_cca_aligner(model, model_general, anchors) for model in [model_cnn, model_nypost]]
+    shift = SemanticShift.compute(*aligners, model_cnn, model_nypost, model_general)
+    expected = research_topic('gun', t_align, *aligners, *models, root=root)
+    result = research_topic('gun', t_align, *aligners, *models, root=root, shift=shift)
+    assert np.isclose(result[2], expected[2])
@@ -0,0 +1,36 @@
+import os
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from corpus import Corpus, tokenize_text
+
+TEXTS = {'gun': ['The gun law passed. Police said the law works!', None, 'Gun owners protested.'],
+         'war': ['The war in Ukraine. Another war?', 'Police and the army.']}
+
+
+@pytest.fixture
+def corpus_root(tmp_path):
+    try:
+        tokenize_text('One sentence. Another one.')
+    except LookupError:
+        pytest.skip('the nltk punkt tokenizer data is not installed')
+    os.makedirs(tmp_path / 'data' / 'CNN')
+    for keyword, texts in TEXTS.items():
+        pd.DataFrame({'title': ['title'] * len(texts), 'text': texts}) \
+            .to_csv(tmp_path / 'data' / 'CNN' / f'CNN_{keyword}.csv', index=False)
+    return tmp_path
+
+
+def test_frequencies_match_the_sentences(corpus_root):
+    corpus = Corpus('CNN', root=str(corpus_root / 'data'), cache=str(corpus_root / 'cache'), workers=1)
+    sentences = list(corpus)
+    assert sentences[0] == ['the', 'gun', 'law', 'passed']
+    assert corpus.frequencies().to_dict() == Counter(w for st in sentences for w in st)
+    # a changed file is counted again, and the tables of its old version are removed
+    path = corpus_root / 'data' / 'CNN' / 'CNN_war.csv'
+    pd.DataFrame({'title': ['title'], 'text': ['Peace talks.']}).to_csv(path, index=False)
+    corpus = Corpus('CNN', root=str(corpus_root / 'data'), cache=str(corpus_root / 'cache'), workers=1)
+    assert corpus.frequencies()['war'] == 0
+    assert len(os.listdir(corpus_root / 'cache' / 'CNN')) == 4
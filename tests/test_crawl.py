@@ -0,0 +1,75 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import crawl
+from crawl import SearchEngine, StreamWriter
+
+
+class FakeNews(object):
+    '''
+    a parsed news whose title and text are derived from its url, failing for every 7th url
+    '''
+    def __init__(self, url, outlet=None):
+        i = int(url.rsplit('/', 1)[1])
+        if i % 7 == 0:
+            raise ValueError(f'failed to download {url}')
+        self.title = f'title {i}'
+        self.text = f'text {i}'
+        self.publish_date = '2023-01-01'
+
+
+def test_parse_keeps_urls_with_their_news(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl, 'News', FakeNews)
+    os.makedirs(tmp_path / 'nypost')
+    engine = SearchEngine(name='nypost', keyword='gun', process=False, root=str(tmp_path),
+                          sleep3=0, limit3=1000, batch_size=4, interval=0.01)
+    engine.urls = [f'https://nypost.com/news/{i}' for i in range(100)]
+    engine.num = len(engine.urls)
+    engine.parse()
+
+    df = pd.read_csv(tmp_path / 'nypost' / 'nypost_gun.csv')
+    assert len(df) == engine.count == 100 - len(range(0, 100, 7))
+    ids = df['url'].str.rsplit('/', n=1).str[1]
+    assert (df['title'] == 'title ' + ids).all()
+    assert (df['text'] == 'text ' + ids).all()
+    assert sorted(ids.astype(int)) == [i for i in range(100) if i % 7]
+
+
+def test_writer_batches_append_one_header(tmp_path):
+    path = tmp_path / 'news.csv'
+    with StreamWriter(str(path), batch_size=3, interval=60) as writer:
+        for i in range(10):
+            writer.put((f'title {i}', f'text {i}', f'url {i}', 'N/A'))
+    df = pd.read_csv(path)
+    assert list(df.columns) == StreamWriter.columns
+    assert df['url'].tolist() == [f'url {i}' for i in range(10)]
+    assert writer.count == 10
+
+
+def test_writer_error_is_raised(tmp_path):
+    # the directory of the csv file does not exist, so the first write fails
+    writer = StreamWriter(str(tmp_path / 'missing' / 'news.csv'), batch_size=1, interval=60).start()
+    writer.put(('title', 'text', 'url', 'N/A'))
+    deadline = time.monotonic() + 10
+    while writer.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(FileNotFoundError):
+        writer.put(('title', 'text', 'url', 'N/A'))
+    with pytest.raises(FileNotFoundError):
+        writer.close()
+
+
+def test_parse_without_news_writes_header(tmp_path):
+    os.makedirs(tmp_path / 'nypost')
+    engine = SearchEngine(name='nypost', keyword='gun', process=False, root=str(tmp_path), sleep3=0)
+    engine.urls = []
+    engine.num = 0
+    engine.parse()
+    engine.remove_dupna()
+
+    df = pd.read_csv(tmp_path / 'nypost' / 'nypost_gun.csv')
+    assert list(df.columns) == StreamWriter.columns
+    assert df.empty
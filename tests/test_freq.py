@@ -0,0 +1,49 @@
+from collections import Counter
+
+import numpy as np
+
+from freq import FrequencyTable
+
+SENTENCES = [['the', 'gun', 'law'], ['the', 'police'], [], ['gun', 'gun', 'war']]
+MORE = [['war', 'in', 'ukraine'], ['the', 'war']]
+
+
+def test_update_counts_like_counter():
+    table = FrequencyTable().update(SENTENCES)
+    assert table.to_dict() == Counter(w for st in SENTENCES for w in st)
+    assert table.total == 8
+
+
+def test_merge_adds_shared_and_new_words():
+    a = FrequencyTable().update(SENTENCES)
+    b = FrequencyTable().update(MORE)
+    merged = a + b
+    assert merged.to_dict() == Counter(w for st in SENTENCES + MORE for w in st)
+    # the operands are left unchanged
+    assert a.to_dict() == Counter(w for st in SENTENCES for w in st)
+    assert sum([a, b]).to_dict() == merged.to_dict()
+    a += b
+    assert a.to_dict() == merged.to_dict()
+
+
+def test_lookup_unknown_words():
+    table = FrequencyTable().update(SENTENCES)
+    assert table.lookup(['gun', 'unknown']).tolist() == [3, 0]
+    assert table['unknown'] == 0
+    assert FrequencyTable().lookup(['gun']).tolist() == [0]
+
+
+def test_save_load(tmp_path):
+    table = FrequencyTable().update(SENTENCES + MORE)
+    path = tmp_path / 'freq.npz'
+    table.save(path)
+    loaded = FrequencyTable.load(path)
+    assert loaded.vocab == table.vocab
+    assert np.array_equal(loaded.counts, table.counts)
+    assert loaded.most_common(2) == table.most_common(2)
+
+
+def test_from_json_drops_total(tmp_path):
+    path = tmp_path / 'freq.json'
+    path.write_text('{"0": 6, "gun": 4, "war": 2}')
+    assert FrequencyTable.from_json(path).to_dict() == {'gun': 4, 'war': 2}